@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from utils import SPEND_COLUMNS, PURCHASE_COLUMNS, categorize, row_totals
 
 def run_clv_dashboard():
     st.title("📊 CLV Dashboard (CSV, Excel, Google Sheets Supported)")
@@ -44,43 +45,56 @@ def run_clv_dashboard():
             except Exception as e:
                 st.error(f"❌ Failed to load from Google Sheets: {e}")
 
+    @st.cache_data
+    def build_features(df):
+        df = categorize(df, ("Gender", "Education", "Marital_Status", "Country"))
+
+        # Date Conversion
+        df["Dt_Customer"] = pd.to_datetime(df["Dt_Customer"], errors='coerce')
+
+        # Spending & Purchases
+        for col in SPEND_COLUMNS:
+            if col not in df.columns:
+                df[col] = 0
+
+        for col in PURCHASE_COLUMNS:
+            if col not in df.columns:
+                df[col] = 0
+
+        # Age, Tenure & CLV Calculation
+        now = pd.Timestamp.now()
+        tenure_days = (now - df["Dt_Customer"]).dt.days.to_numpy()
+        tenure_years = tenure_days / 365.0
+        total_spending = row_totals(df, SPEND_COLUMNS)
+        purchase_freq = row_totals(df, PURCHASE_COLUMNS)
+        profit_margin = total_spending * 0.3
+
+        df = df.assign(
+            Age=now.year - df["Year_Birth"].to_numpy() if "Year_Birth" in df.columns else None,
+            Customer_Tenure=tenure_days,
+            Tenure_Years=tenure_years,
+            Total_Spending=total_spending,
+            Purchase_Frequency=purchase_freq,
+            Profit_Margin=profit_margin,
+            CLV=np.round(profit_margin * purchase_freq * tenure_years, 2),
+        )
+        return df
+
     # ========== PROCESSING CLV ========== #
     if df is not None:
         try:
-            # Date Conversion
-            if "Dt_Customer" in df.columns:
-                df["Dt_Customer"] = pd.to_datetime(df["Dt_Customer"], errors='coerce')
-            else:
+            if "Dt_Customer" not in df.columns:
                 st.error("❌ 'Dt_Customer' column is required.")
                 st.stop()
 
-            # Age & Tenure
-            df["Age"] = datetime.now().year - df["Year_Birth"] if "Year_Birth" in df.columns else None
-            df["Customer_Tenure"] = (datetime.now() - df["Dt_Customer"]).dt.days
-            df["Tenure_Years"] = df["Customer_Tenure"] / 365
-
-            # Spending & Purchases
-            spend_cols = ["MntWines", "MntFruits", "MntMeatProducts", "MntFishProducts", "MntSweetProducts", "MntGoldProds"]
-            for col in spend_cols:
-                if col not in df.columns:
-                    df[col] = 0
-            df["Total_Spending"] = df[spend_cols].sum(axis=1)
-
-            purchase_cols = ["NumDealsPurchases", "NumWebPurchases", "NumCatalogPurchases", "NumStorePurchases"]
-            for col in purchase_cols:
-                if col not in df.columns:
-                    df[col] = 0
-            df["Purchase_Frequency"] = df[purchase_cols].sum(axis=1)
-
-            # CLV Calculation
-            df["Profit_Margin"] = df["Total_Spending"] * 0.3
-            df["CLV"] = (df["Profit_Margin"] * df["Purchase_Frequency"] * df["Tenure_Years"]).round(2)
+            # Base features are cached so filter changes only re-run the filter step
+            df = build_features(df)
 
             # ========== FILTERS ==========
             st.sidebar.header("🔍 Filters")
-            gender_opt = df["Gender"].dropna().unique().tolist() if "Gender" in df.columns else []
-            marital_opt = df["Marital_Status"].dropna().unique().tolist() if "Marital_Status" in df.columns else []
-            edu_opt = df["Education"].dropna().unique().tolist() if "Education" in df.columns else []
+            gender_opt = df["Gender"].cat.categories.tolist() if "Gender" in df.columns else []
+            marital_opt = df["Marital_Status"].cat.categories.tolist() if "Marital_Status" in df.columns else []
+            edu_opt = df["Education"].cat.categories.tolist() if "Education" in df.columns else []
 
             gender_filter = st.sidebar.multiselect("Gender", gender_opt, default=gender_opt)
             marital_filter = st.sidebar.multiselect("Marital Status", marital_opt, default=marital_opt)
@@ -97,7 +111,9 @@ def run_clv_dashboard():
             st.subheader("📈 CLV Summary Table")
             show_cols = ["ID", "Age", "Total_Spending", "Purchase_Frequency", "Tenure_Years", "CLV"]
             show_cols = [col for col in show_cols if col in df.columns]
-            st.dataframe(df[show_cols].sort_values(by="CLV", ascending=False).reset_index(drop=True))
+            # Sorted once; the Top-N chart below reuses the head of this ranking
+            ranked = df.sort_values(by="CLV", ascending=False, kind="stable")
+            st.dataframe(ranked[show_cols].reset_index(drop=True))
 
             # ========== DOWNLOAD ==========
             csv = df.to_csv(index=False)
@@ -122,7 +138,7 @@ def run_clv_dashboard():
                 st.pyplot(fig)
 
             elif pie_by == "Region":
-                clv_by_region = df.groupby("Country")["CLV"].sum().sort_values(ascending=False).head(10)
+                clv_by_region = df.groupby("Country", observed=True)["CLV"].sum().sort_values(ascending=False).head(10)
                 fig, ax = plt.subplots(figsize=(6, 6))
                 clv_by_region.plot.pie(autopct='%1.1f%%', ylabel='', ax=ax)
                 ax.set_title("CLV by Region (Top 10)")
@@ -132,7 +148,7 @@ def run_clv_dashboard():
             st.subheader("📊 Top Customers by CLV")
             top_n = st.slider("Select Top N", 5, 50, 10)
             if "ID" in df.columns:
-                top_clv = df.sort_values(by="CLV", ascending=False).head(top_n)
+                top_clv = ranked.head(top_n)
                 fig, ax = plt.subplots(figsize=(10, 5))
                 ax.bar(top_clv["ID"].astype(str), top_clv["CLV"], color='skyblue')
                 ax.set_title("Top Customers by CLV")
@@ -3,9 +3,13 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
-from datetime import datetime
 from xgboost import XGBRegressor
 import matplotlib.pyplot as plt
+from utils import SPEND_COLUMNS, PURCHASE_COLUMNS, categorize, row_totals, to_csv_bytes
+
+@st.cache_resource
+def get_model(path="xgb_model.pkl"):
+    return joblib.load(path), joblib.load("features.pkl")
 
 def run_clv():
 
@@ -39,33 +43,40 @@ def run_clv():
 
     @st.cache_data
     def load_data(uploaded_file):
+        read_opts = dict(parse_dates=["Dt_Customer"])
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
+            df = pd.read_csv(uploaded_file, **read_opts)
             st.success("✅ File uploaded successfully!")
         else:
-            df = pd.read_csv("customer_data.csv")
-        return df
+            df = pd.read_csv("customer_data.csv", **read_opts)
+
+        return categorize(df, ("Gender", "Education", "Marital_Status"))
 
     raw_df = load_data(uploaded_file)
-    df = raw_df.copy()
 
     # Feature Engineering
-    df["Dt_Customer"] = pd.to_datetime(df["Dt_Customer"])
-    current_year = datetime.now().year
-    df["Age"] = current_year - df["Year_Birth"]
-    df["Customer_Tenure"] = (datetime.now() - df["Dt_Customer"]).dt.days
-    df["Tenure_Years"] = df["Customer_Tenure"] / 365
-
-    spend_cols = ["MntWines", "MntFruits", "MntMeatProducts", "MntFishProducts", "MntSweetProducts", "MntGoldProds"]
-    df["Total_Spending"] = df[spend_cols].sum(axis=1)
-
-    purchase_cols = ["NumDealsPurchases", "NumWebPurchases", "NumCatalogPurchases", "NumStorePurchases"]
-    df["Purchase_Frequency"] = df[purchase_cols].sum(axis=1)
+    @st.cache_data
+    def build_features(raw_df):
+        now = pd.Timestamp.now()
+        tenure_days = (now - raw_df["Dt_Customer"]).dt.days.to_numpy()
+        tenure_years = tenure_days / 365.0
+        total_spending = row_totals(raw_df, SPEND_COLUMNS)
+        purchase_freq = row_totals(raw_df, PURCHASE_COLUMNS)
+        profit_margin = total_spending * 0.3
+
+        df = raw_df.assign(
+            Age=now.year - raw_df["Year_Birth"].to_numpy(),
+            Customer_Tenure=tenure_days,
+            Tenure_Years=tenure_years,
+            Total_Spending=total_spending,
+            Purchase_Frequency=purchase_freq,
+            Profit_Margin=profit_margin,
+            CLV=np.round(profit_margin * purchase_freq * tenure_years, 2),
+        )
+        df.dropna(inplace=True)
+        return df
 
-    df["Profit_Margin"] = df["Total_Spending"] * 0.3
-    df["CLV"] = df["Profit_Margin"] * df["Purchase_Frequency"] * df["Tenure_Years"]
-    df["CLV"] = df["CLV"].round(2)
-    df.dropna(inplace=True)
+    df = build_features(raw_df)
 
     def train_model(df):
         features = [
@@ -74,10 +85,11 @@ def run_clv():
             'NumCatalogPurchases', 'Customer_Tenure', 'Tenure_Years',
             'Total_Spending', 'Purchase_Frequency', 'Profit_Margin'
         ]
-        X = df[features]
+        # C-contiguous float32 lets XGBoost build its DMatrix without a copy
+        X = np.ascontiguousarray(df[features].to_numpy(dtype=np.float32))
         y = df["CLV"]
 
-        model = XGBRegressor(n_estimators=100, max_depth=5, learning_rate=0.1, random_state=42)
+        model = XGBRegressor(n_estimators=100, max_depth=5, learning_rate=0.1, tree_method='hist', n_jobs=-1, random_state=42)
         model.fit(X, y)
 
         joblib.dump(model, "xgb_model.pkl")
@@ -125,37 +137,44 @@ def run_clv():
             "Profit_Margin": Profit_Margin
         }
 
-        return pd.DataFrame([data])
+        return data
+
+    # Model load/retrain (file check done once per session, refreshed after training)
+    if "model_ready" not in st.session_state:
+        st.session_state.model_ready = os.path.exists("xgb_model.pkl") and os.path.exists("features.pkl")
 
-    # Model load/retrain
     if st.sidebar.button("🔁 Retrain Model"):
         with st.spinner("Training model..."):
             model, features = train_model(df)
+            get_model.clear()
+            st.session_state.model_ready = True
             st.success("Model retrained and saved!")
-    elif not os.path.exists("xgb_model.pkl") or not os.path.exists("features.pkl"):
+    elif not st.session_state.model_ready:
         with st.spinner("Training model..."):
             model, features = train_model(df)
+            get_model.clear()
+            st.session_state.model_ready = True
             st.success("Model trained and saved!")
     else:
-        model = joblib.load("xgb_model.pkl")
-        features = joblib.load("features.pkl")
+        model, features = get_model()
 
     # Show dataset
     with st.expander("📊 View Dataset"):
         st.write(raw_df.head())
 
     # Predict
-    input_df = user_input(df)
-    predict_df = input_df[features]
+    data = user_input(df)
+    # Model input row in `features` order (an ndarray has no feature names to validate)
+    row = np.array([[data[f] for f in features]], dtype=np.float32)
 
     if st.sidebar.button("🎯 Predict CLV"):
-        prediction = model.predict(predict_df)[0]
+        prediction = float(model.predict(row, validate_features=False)[0])
 
-        profit = input_df["Profit_Margin"].values[0]
-        freq = input_df["Purchase_Frequency"].values[0]
-        tenure = input_df["Tenure_Years"].values[0]
+        profit = data["Profit_Margin"]
+        freq = data["Purchase_Frequency"]
+        tenure = data["Tenure_Years"]
         manual_clv = profit * freq * tenure
-        annualized_clv = profit * (freq / tenure)
+        annualized_clv = profit * (freq / tenure) if tenure else 0.0
 
         st.markdown("## 💡 CLV Results")
         col1, col2, col3 = st.columns(3)
@@ -187,8 +206,10 @@ def run_clv():
         """)
 
         # Save & download
-        input_df["Model_Predicted_CLV"] = prediction
-        input_df["Manual_CLV"] = manual_clv
-        input_df["Annualized_CLV"] = annualized_clv
+        input_df = pd.DataFrame([data]).assign(
+            Model_Predicted_CLV=prediction,
+            Manual_CLV=manual_clv,
+            Annualized_CLV=annualized_clv,
+        )
 
-        st.download_button("⬇️ Download Result", input_df.to_csv(index=False), "clv_result.csv")
+        st.download_button("⬇️ Download Result", to_csv_bytes(input_df), "clv_result.csv")
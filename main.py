@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 import os
+import tempfile
 from datetime import datetime
 try:
     from streamlit_autorefresh import st_autorefresh
@@ -28,11 +29,24 @@ def load_users():
             return json.load(f)
     return {}
 
-def save_users(users):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+# Shared mutable holder: users.json is parsed once per process
+@st.cache_resource
+def users_cache():
+    return {"data": load_users()}
 
-users = load_users()
+def save_users(users):
+    # The cached dict is authoritative; each write gets its own temp file that is swapped in atomically
+    users_cache()["data"] = users
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(USER_FILE)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(users))
+        os.replace(tmp, USER_FILE)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+users = users_cache()["data"]
 
 # ---------------------- Session State ----------------------
 if "authenticated" not in st.session_state:
@@ -1,7 +1,19 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import io
+import re
+from functools import lru_cache
+from scipy.sparse import csr_matrix
 from mlxtend.frequent_patterns import apriori, association_rules
 import plotly.express as px
+from utils import to_csv_bytes
+
+@lru_cache(maxsize=None)
+def keyword_pattern(keywords):
+    # One alternation regex over the normalized keywords, compiled once per keyword set
+    norm_kws = (kw.lower().replace("_", " ").replace("-", " ") for kw in keywords)
+    return re.compile("|".join(re.escape(kw) for kw in norm_kws))
 
 def run_marketbasket():
     st.title("🛒 Market Basket Analysis")
@@ -23,67 +35,90 @@ def run_marketbasket():
         unsafe_allow_html=True,
     )
 
+    def find_column(cols, keywords):
+        pattern = keyword_pattern(tuple(keywords))
+        for col in cols:
+            if pattern.search(col.lower().replace("_", " ").replace("-", " ")):
+                return col
+        return None
+
+    # Keyed on the raw upload bytes: cheap to hash, and a hit skips parsing and basket building
+    @st.cache_data(show_spinner=False)
+    def build_basket(file_bytes):
+        try:
+            df = pd.read_csv(io.BytesIO(file_bytes), sep=None, engine='python')
+        except Exception:
+            df = pd.read_csv(io.BytesIO(file_bytes))
+
+        invoice_col = find_column(df.columns.tolist(), ["bill no", "billno", "invoice", "invoice no", "transaction id"])
+        product_col = find_column(df.columns.tolist(), ["item name", "item", "product", "product name"])
+
+        if invoice_col is None or product_col is None:
+            return None
+
+        # Keep items bought more than 50 times, counted straight off the factorized codes
+        item_codes, _ = pd.factorize(df[product_col])
+        present = item_codes >= 0
+        item_counts = np.bincount(item_codes[present])
+        common = np.zeros(len(item_codes), dtype=bool)
+        common[present] = item_counts[item_codes[present]] > 50
+        df = df[common]
+
+        # One-hot basket as a sparse boolean invoice x product matrix (mostly zeros)
+        inv_codes, inv_uniques = pd.factorize(df[invoice_col])
+        prod_codes, prod_uniques = pd.factorize(df[product_col])
+        valid = (inv_codes >= 0) & (prod_codes >= 0)
+        mat = csr_matrix(
+            (np.ones(valid.sum(), dtype=bool), (inv_codes[valid], prod_codes[valid])),
+            shape=(len(inv_uniques), len(prod_uniques)),
+        )
+        return pd.DataFrame.sparse.from_spmatrix(mat, index=inv_uniques, columns=prod_uniques)
+
+    # Only the thresholds and upload bytes form the key, so picking a product never re-runs apriori
     @st.cache_data(show_spinner=False)
-    def generate_rules(basket):
-        freq_items = apriori(basket, min_support=0.02, use_colnames=True)
-        rules = association_rules(freq_items, metric="confidence", min_threshold=0.4)
+    def process_transactions(file_bytes, min_support=0.02, min_conf=0.4):
+        basket = build_basket(file_bytes)
+        if basket is None:
+            return None
+
+        freq_items = apriori(basket, min_support=min_support, use_colnames=True, low_memory=True)
+        rules = association_rules(freq_items, metric="confidence", min_threshold=min_conf)
         rules = rules[
             (rules['antecedents'].apply(len) == 1) &
             (rules['consequents'].apply(len) == 1) &
-            (rules['support'] >= 0.02) &
-            (rules['confidence'] >= 0.4) &
+            (rules['support'] >= min_support) &
+            (rules['confidence'] >= min_conf) &
             (rules['lift'] >= 1.0)
-        ]
-        return rules
+        ].copy()
 
-    def find_column(cols, keywords):
-        for col in cols:
-            for kw in keywords:
-                norm_col = col.lower().replace("_", " ").replace("-", " ")
-                norm_kw = kw.lower().replace("_", " ").replace("-", " ")
-                if norm_kw in norm_col:
-                    return col
-        return None
+        # Rules are filtered to single-item sides, so unpack each frozenset directly
+        rules['antecedents_str'] = [next(iter(s)) for s in rules['antecedents'].to_numpy()]
+        rules['consequents_str'] = [next(iter(s)) for s in rules['consequents'].to_numpy()]
+        return rules
 
     uploaded_file = st.file_uploader("📂 Upload your transaction CSV file", type=["csv"], key="market")
     if uploaded_file is None:
         st.info("📌 Please upload a CSV file with transaction data (Bill No + Item Name columns).")
         return
 
-    with st.spinner("Loading and processing data..."):
-        try:
-            df = pd.read_csv(uploaded_file, sep=None, engine='python')
-        except Exception:
-            df = pd.read_csv(uploaded_file)
-
-    invoice_col = find_column(df.columns.tolist(), ["bill no", "billno", "invoice", "invoice no", "transaction id"])
-    product_col = find_column(df.columns.tolist(), ["item name", "item", "product", "product name"])
-
-    if invoice_col is None or product_col is None:
-        st.error("❌ CSV must contain columns like 'Bill No' and 'Item Name'.")
-        st.stop()
-
-    item_counts = df[product_col].value_counts()
-    common_items = item_counts[item_counts > 50].index
-    df = df[df[product_col].isin(common_items)]
+    st.sidebar.header("⚙️ Rule Thresholds")
+    min_support = st.sidebar.slider("Minimum support", 0.005, 0.2, 0.02, 0.005)
+    min_conf = st.sidebar.slider("Minimum confidence", 0.1, 1.0, 0.4, 0.05)
 
     progress_bar = st.progress(0)
 
-    basket = df.groupby([invoice_col, product_col]).size().unstack(fill_value=0)
-    progress_bar.progress(25)
-
-    basket = basket > 0
-    progress_bar.progress(50)
-
-    rules = generate_rules(basket)
+    with st.spinner("Loading and processing data..."):
+        rules = process_transactions(uploaded_file.getvalue(), min_support, min_conf)
     progress_bar.progress(75)
 
+    if rules is None:
+        st.error("❌ CSV must contain columns like 'Bill No' and 'Item Name'.")
+        st.stop()
+
     if rules.empty:
         st.warning("⚠️ No association rules found.")
         return
 
-    rules['antecedents_str'] = rules['antecedents'].apply(lambda x: next(iter(x)))
-    rules['consequents_str'] = rules['consequents'].apply(lambda x: next(iter(x)))
     progress_bar.progress(100)
 
     st.subheader(f"📊 Product Pairs Bought Together ({len(rules)})")
@@ -108,16 +143,23 @@ def run_marketbasket():
     recommendations = rules[rules['antecedents_str'] == selected_product].sort_values(by='confidence', ascending=False)
 
     if not recommendations.empty:
-        for _, row in recommendations.iterrows():
-            st.markdown(
-                f"**If customer buys:** `{row['antecedents_str']}`  ➡️ "
-                f"**Recommend:** `{row['consequents_str']}`  | "
-                f"Confidence: {row['confidence']:.2f}, Lift: {row['lift']:.2f}"
+        # All recommendation rows rendered as one markdown element
+        lines = [
+            f"- **If customer buys:** `{ante}`  ➡️ "
+            f"**Recommend:** `{cons}`  | "
+            f"Confidence: {conf:.2f}, Lift: {lift:.2f}"
+            for ante, cons, conf, lift in zip(
+                recommendations['antecedents_str'].to_numpy(),
+                recommendations['consequents_str'].to_numpy(),
+                recommendations['confidence'].to_numpy(),
+                recommendations['lift'].to_numpy(),
             )
+        ]
+        st.markdown("\n".join(lines))
     else:
         st.info("No recommendations found for selected product.")
 
-    csv = rules[['antecedents_str', 'consequents_str', 'support', 'confidence', 'lift']].to_csv(index=False).encode('utf-8')
+    csv = to_csv_bytes(rules[['antecedents_str', 'consequents_str', 'support', 'confidence', 'lift']])
     st.download_button("📥 Download Product Pairs CSV", csv, file_name='product_pairs.csv', mime='text/csv')
 
 
@@ -1,9 +1,134 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # headless renderer; must be selected before pyplot/seaborn load
 import seaborn as sns
 import matplotlib.pyplot as plt
-from textblob import TextBlob
+from textblob.en.sentiments import PatternAnalyzer
 import io
+from pandas.api.types import is_datetime64_any_dtype
+
+# TextBlob's default analyzer, shared so its lexicon is loaded once per process
+SENTIMENT_ANALYZER = PatternAnalyzer()
+
+def score_polarity(texts):
+    # Same scores as TextBlob(t).sentiment.polarity, but each distinct text is analyzed once
+    codes, uniques = pd.factorize(pd.Series(texts, dtype=object))
+    pol = np.fromiter((SENTIMENT_ANALYZER.analyze(t).polarity for t in uniques), dtype=np.float64, count=len(uniques))
+    return pol[codes]
+
+# Shared across reruns without a per-hit copy; callers only slice it, never mutate it
+@st.cache_resource(show_spinner=False)
+def prepare_data(file_bytes, sentiment_col, text_col, age_col, time_col, country_col):
+    # Only the mapped columns are parsed; the multithreaded pyarrow reader is used when installed
+    usecols = list(dict.fromkeys([sentiment_col or text_col, age_col, time_col, country_col]))
+    read_opts = dict(encoding='ISO-8859-1', usecols=usecols,
+                     dtype={age_col: 'string', time_col: 'string', country_col: 'category'})
+    try:
+        df = pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow', dtype_backend='pyarrow', **read_opts)
+    except (ImportError, ValueError):
+        df = pd.read_csv(io.BytesIO(file_bytes), **read_opts)
+
+    # Prepare dataframe with renamed columns
+    rename_map = {
+        age_col: 'Age',
+        time_col: 'Time of Tweet',
+        country_col: 'Country'
+    }
+    if sentiment_col:
+        rename_map[sentiment_col] = 'Sentiment'
+    df_renamed = df.rename(columns=rename_map)
+
+    # If no sentiment column, predict sentiment using TextBlob
+    if sentiment_col is None:
+        # Score all polarities in one pass, then label them with a single vectorized select
+        texts = df_renamed[text_col].fillna('').astype(str).tolist()
+        pol = score_polarity(texts)
+        df_renamed['Sentiment'] = np.select([pol > 0.1, pol < -0.1], ['Positive', 'Negative'], default='Neutral')
+
+    # Drop rows with missing values in required columns
+    df_clean = df_renamed[['Sentiment', 'Age', 'Time of Tweet', 'Country']].dropna()
+
+    # Convert Age ranges ('21-30') or single numbers ('25') to numeric midpoint; other values are dropped
+    ages = df_clean['Age'].astype(str).str.extract(r'^\s*(\d+)\s*(?:-\s*(\d+))?\s*$')
+    start = pd.to_numeric(ages[0], errors='coerce')
+    end = pd.to_numeric(ages[1], errors='coerce').fillna(start)
+    df_clean['Age_numeric'] = (start + end) // 2
+    df_clean = df_clean.dropna(subset=['Age_numeric']).astype({'Age_numeric': 'int32'})
+    # Predicted-sentiment download: the columns as read, before the plotting transforms below
+    export_csv = df_clean.to_csv(index=False).encode('utf-8') if sentiment_col is None else None
+    # Age buckets used as the hue of the age chart
+    df_clean['AgeGroup'] = pd.cut(df_clean['Age_numeric'], bins=[0, 18, 30, 45, 60, 200], right=False,
+                                  labels=['<18', '18-29', '30-44', '45-59', '60+'])
+
+    # Low-cardinality labels as categoricals, with Sentiment lower-cased
+    df_clean['Sentiment'] = df_clean['Sentiment'].astype(str).str.strip().str.lower().astype('category')
+    df_clean['Country'] = df_clean['Country'].astype('category')
+
+    # Dates are parsed here; labels like 'morning' stay categorical for the multiselect filter
+    parsed_times = pd.to_datetime(df_clean['Time of Tweet'], errors='coerce')
+    if parsed_times.notna().all():
+        df_clean['Time of Tweet'] = parsed_times
+    else:
+        df_clean['Time of Tweet'] = df_clean['Time of Tweet'].astype('category')
+    return df_clean, export_csv
+
+def mapping_error(sentiment_col, text_col, age_col, time_col, country_col):
+    if sentiment_col is None and not text_col:
+        return "❌ Please select the text column for sentiment prediction."
+    if not all([age_col, time_col, country_col]):
+        return "❌ Please select all required columns."
+    return None
+
+def observed_counts(df, by):
+    # Row counts per combination present in df; unused categories are dropped so seaborn draws no empty bars
+    agg = df.groupby(by, observed=True).size().reset_index(name='count')
+    return agg.apply(lambda c: c.cat.remove_unused_categories() if isinstance(c.dtype, pd.CategoricalDtype) else c)
+
+def filter_mask(df_clean, age_range, date_range, selected_times, selected_country):
+    # Boolean mask over raw NumPy arrays
+    ages = df_clean['Age_numeric'].to_numpy()
+    mask = (ages >= age_range[0]) & (ages <= age_range[1])
+    if date_range is not None and len(date_range) == 2:
+        start_date, end_date = date_range
+        # NaT views as the minimum int64, so it falls outside any date range
+        times = df_clean['Time of Tweet'].to_numpy(dtype='datetime64[ns]').view('i8')
+        lo, hi = pd.Timestamp(start_date).value, pd.Timestamp(end_date).value
+        mask &= (times >= lo) & (times <= hi)
+    elif selected_times is not None:
+        mask &= df_clean['Time of Tweet'].isin(selected_times).to_numpy()
+    if selected_country != "All":
+        mask &= (df_clean['Country'] == selected_country).to_numpy()
+    return mask
+
+# Figures are cached on small pre-aggregated inputs and closed so pyplot doesn't accumulate them
+@st.cache_data(show_spinner=False)
+def plot_sentiment_distribution(counts):
+    fig1, ax1 = plt.subplots()
+    sns.barplot(data=counts, x='Sentiment', y='count', hue='Sentiment', palette="Set2", ax=ax1)
+    ax1.set_title("Sentiment Distribution")
+    plt.close(fig1)
+    return fig1
+
+@st.cache_data(show_spinner=False)
+def plot_sentiment_by(agg, hue_col, title):
+    # Bars drawn from pre-counted (Sentiment, hue) pairs
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(data=agg, x='Sentiment', y='count', hue=hue_col, ax=ax)
+    ax.set_title(title)
+    plt.close(fig)
+    return fig
+
+@st.cache_data(show_spinner=False)
+def plot_top_negative_countries(top_countries):
+    fig4, ax4 = plt.subplots(figsize=(10, 6))
+    top_countries.plot(kind='bar', color='teal', ax=ax4)
+    ax4.set_title("Top 10 Countries with Most Negative Tweets")
+    ax4.set_xlabel("Country")
+    ax4.set_ylabel("Count")
+    plt.close(fig4)
+    return fig4
 
 def run_sentiment():
     st.title("📈 Sentiment Visualizer")
@@ -11,91 +136,58 @@ def run_sentiment():
     uploaded_file = st.file_uploader("Upload your dataset (CSV)", type=["csv"], key='sentiment')
     if uploaded_file:
         try:
-            df = pd.read_csv(uploaded_file, encoding='ISO-8859-1')
+            # Header only: the full parse happens once, in the cached prepare_data
+            file_bytes = uploaded_file.getvalue()
+            cols = pd.read_csv(io.BytesIO(file_bytes), encoding='ISO-8859-1', nrows=0).columns.tolist()
 
             st.header("Map your dataset columns")
-            cols = df.columns.tolist()
 
             # Detect sentiment column automatically (case insensitive)
             sentiment_col_candidates = ['Sentiment', 'sentiment', 'sentiments']
             sentiment_col = None
             for col in sentiment_col_candidates:
-                if col in df.columns:
+                if col in cols:
                     sentiment_col = col
                     break
 
             if sentiment_col is None:
                 st.warning("No sentiment column found. Please select the text column to predict sentiment.")
-                text_col = st.selectbox("Select Text Column for Sentiment Prediction", options=cols)
             else:
                 st.success(f"Found Sentiment column: {sentiment_col}")
+
+            # Column mapping form; analysis runs only for a submitted mapping
+            with st.form("column_mapping"):
                 text_col = None
+                if sentiment_col is None:
+                    text_col = st.selectbox("Select Text Column for Sentiment Prediction", options=cols)
+                age_col = st.selectbox("Select Age column", options=cols)
+                time_col = st.selectbox("Select Time of Tweet column", options=cols)
+                country_col = st.selectbox("Select Country column", options=cols)
+                submitted = st.form_submit_button("Process")
 
-            age_col = st.selectbox("Select Age column", options=cols)
-            time_col = st.selectbox("Select Time of Tweet column", options=cols)
-            country_col = st.selectbox("Select Country column", options=cols)
+            file_key = uploaded_file.file_id
+            if submitted:
+                st.session_state.sentiment_mapping = (file_key, (text_col, age_col, time_col, country_col))
+            saved = st.session_state.get('sentiment_mapping')
+            if saved is None or saved[0] != file_key:
+                st.info("Select your columns and click Process to run the analysis.")
+                return
+            text_col, age_col, time_col, country_col = saved[1]
 
-            if sentiment_col is None and not text_col:
-                st.error("❌ Please select the text column for sentiment prediction.")
-            elif not all([age_col, time_col, country_col]):
-                st.error("❌ Please select all required columns.")
+            error = mapping_error(sentiment_col, text_col, age_col, time_col, country_col)
+            if error:
+                st.error(error)
             else:
-                # Prepare dataframe with renamed columns
-                rename_map = {
-                    age_col: 'Age',
-                    time_col: 'Time of Tweet',
-                    country_col: 'Country'
-                }
-                if sentiment_col:
-                    rename_map[sentiment_col] = 'Sentiment'
-                df_renamed = df.rename(columns=rename_map)
-
-                # If no sentiment column, predict sentiment using TextBlob
+                # Cached on the upload bytes and column mapping
+                df_clean, export_csv = prepare_data(file_bytes, sentiment_col, text_col, age_col, time_col, country_col)
                 if sentiment_col is None:
-                    def get_sentiment(text):
-                        if pd.isna(text):
-                            return "Neutral"
-                        polarity = TextBlob(str(text)).sentiment.polarity
-                        if polarity > 0.1:
-                            return "Positive"
-                        elif polarity < -0.1:
-                            return "Negative"
-                        else:
-                            return "Neutral"
-
-                    df_renamed['Sentiment'] = df_renamed[text_col].apply(get_sentiment)
                     st.success("✅ Sentiment predicted automatically using TextBlob!")
 
-                # Drop rows with missing values in required columns
-                df_clean = df_renamed[['Sentiment', 'Age', 'Time of Tweet', 'Country']].dropna()
-
-                # Convert Age ranges to numeric midpoint
-                def age_to_midpoint(age_range):
-                    try:
-                        s = str(age_range).strip()
-                        if '-' in s:
-                            parts = [p.strip() for p in s.split('-', 1)]
-                            start = int(parts[0])
-                            end = int(parts[1])
-                            return (start + end) // 2
-                        else:
-                            # single number like '25' or ranges with non-standard formatting
-                            return int(s)
-                    except:
-                        return None
-
-                df_clean['Age_numeric'] = df_clean['Age'].apply(age_to_midpoint)
-                df_clean = df_clean.dropna(subset=['Age_numeric'])
-
                 # --- Add CSV download button if sentiment was predicted ---
                 if sentiment_col is None:
-                    csv_buffer = io.StringIO()
-                    df_clean.to_csv(csv_buffer, index=False)
-                    csv_data = csv_buffer.getvalue()
-
                     st.download_button(
                         label="📥 Download CSV with Predicted Sentiment",
-                        data=csv_data,
+                        data=export_csv,
                         file_name="sentiment_predicted.csv",
                         mime="text/csv"
                     )
@@ -105,48 +197,38 @@ def run_sentiment():
                 # --- FILTERS ---
                 st.sidebar.header("Filter your data")
 
-                # Age slider filter
-                min_age = int(df_clean['Age_numeric'].min())
-                max_age = int(df_clean['Age_numeric'].max())
-                age_range = st.sidebar.slider("Select Age Range", min_value=min_age, max_value=max_age, value=(min_age, max_age))
-
-                # Time of Tweet filter
-                try:
-                    df_clean['Time of Tweet'] = pd.to_datetime(df_clean['Time of Tweet'])
-                    min_date = df_clean['Time of Tweet'].min()
-                    max_date = df_clean['Time of Tweet'].max()
-                    # ensure we pass date objects to streamlit's date_input
-                    try:
-                        min_date_input = min_date.date()
-                        max_date_input = max_date.date()
-                    except Exception:
-                        min_date_input = pd.to_datetime(min_date).date()
-                        max_date_input = pd.to_datetime(max_date).date()
-
-                    date_range = st.sidebar.date_input("Select Date Range", [min_date_input, max_date_input])
-                    if len(date_range) == 2:
-                        start_date, end_date = date_range
-                        df_filtered = df_clean[
-                            (df_clean['Age_numeric'] >= age_range[0]) & (df_clean['Age_numeric'] <= age_range[1]) &
-                            (df_clean['Time of Tweet'] >= pd.Timestamp(start_date)) & (df_clean['Time of Tweet'] <= pd.Timestamp(end_date))
-                        ]
+                # Filters are applied together on submit
+                with st.sidebar.form("sentiment_filters"):
+                    # Age slider filter
+                    min_age = int(df_clean['Age_numeric'].min())
+                    max_age = int(df_clean['Age_numeric'].max())
+                    age_range = st.slider("Select Age Range", min_value=min_age, max_value=max_age, value=(min_age, max_age))
+
+                    # Time of Tweet filter (already parsed in prepare_data when the values are dates)
+                    date_range, selected_times = None, None
+                    if is_datetime64_any_dtype(df_clean['Time of Tweet']):
+                        # ensure we pass date objects to streamlit's date_input
+                        min_date_input = df_clean['Time of Tweet'].min().date()
+                        max_date_input = df_clean['Time of Tweet'].max().date()
+                        date_range = tuple(st.date_input("Select Date Range", [min_date_input, max_date_input]))
                     else:
-                        df_filtered = df_clean[
-                            (df_clean['Age_numeric'] >= age_range[0]) & (df_clean['Age_numeric'] <= age_range[1])
-                        ]
-                except Exception:
-                    time_options = df_clean['Time of Tweet'].unique().tolist()
-                    selected_times = st.sidebar.multiselect("Select Time of Tweet", options=time_options, default=time_options)
-                    df_filtered = df_clean[
-                        (df_clean['Age_numeric'] >= age_range[0]) & (df_clean['Age_numeric'] <= age_range[1]) &
-                        (df_clean['Time of Tweet'].isin(selected_times))
-                    ]
+                        time_options = df_clean['Time of Tweet'].cat.categories.tolist()
+                        selected_times = tuple(st.multiselect("Select Time of Tweet", options=time_options, default=time_options))
 
-                # Country filter in sidebar (dropdown)
-                country_options = df_clean['Country'].unique().tolist()
-                selected_country = st.sidebar.selectbox("Select Country", options=["All"] + country_options)
-                if selected_country != "All":
-                    df_filtered = df_filtered[df_filtered['Country'] == selected_country]
+                    # Country filter in sidebar (dropdown)
+                    country_options = df_clean['Country'].cat.categories.tolist()
+                    selected_country = st.selectbox("Select Country", options=["All"] + country_options)
+
+                    st.form_submit_button("Apply filters")
+
+                # Filtered frame kept in session state until a filter or the prepared frame changes
+                filter_key = (id(df_clean), age_range, date_range, selected_times, selected_country)
+                if st.session_state.get('sentiment_filter_key') != filter_key:
+                    st.session_state.sentiment_filtered = df_clean[
+                        filter_mask(df_clean, age_range, date_range, selected_times, selected_country)
+                    ]
+                    st.session_state.sentiment_filter_key = filter_key
+                df_filtered = st.session_state.sentiment_filtered
 
                 st.write(f"### Filtered data contains {df_filtered.shape[0]} records.")
 
@@ -163,35 +245,30 @@ def run_sentiment():
 
                     if graph_option == 'Sentiment Distribution':
                         st.subheader("📊 Sentiment Distribution")
-                        fig1, ax1 = plt.subplots()
-                        sns.countplot(data=df_filtered, x='Sentiment', hue='Sentiment', palette="Set2", ax=ax1)
-                        ax1.set_title("Sentiment Distribution")
-                        st.pyplot(fig1)
+                        counts = observed_counts(df_filtered, 'Sentiment')
+                        st.pyplot(plot_sentiment_distribution(counts))
 
                     elif graph_option == 'Sentiment by Age Group':
                         st.subheader("👥 Sentiment Count by Age Group")
-                        fig2, ax2 = plt.subplots(figsize=(10, 6))
-                        sns.countplot(data=df_filtered, x='Sentiment', hue='Age_numeric', ax=ax2)
-                        ax2.set_title("Sentiment Count by Age Group")
-                        st.pyplot(fig2)
+                        agg = observed_counts(df_filtered, ['Sentiment', 'AgeGroup'])
+                        st.pyplot(plot_sentiment_by(agg, 'AgeGroup', "Sentiment Count by Age Group"))
 
                     elif graph_option == 'Sentiment by Time of Tweet':
                         st.subheader("⏰ Sentiment Count by Time of Tweet")
-                        fig3, ax3 = plt.subplots(figsize=(10, 6))
-                        sns.countplot(data=df_filtered, x='Sentiment', hue='Time of Tweet', ax=ax3)
-                        ax3.set_title("Sentiment Count by Time of Tweet")
-                        st.pyplot(fig3)
+                        agg = observed_counts(df_filtered, ['Sentiment', 'Time of Tweet'])
+                        st.pyplot(plot_sentiment_by(agg, 'Time of Tweet', "Sentiment Count by Time of Tweet"))
 
                     else:  # Top 10 Countries with Most Negative Tweets
                         st.subheader("🌍 Top 10 Countries with Most Negative Tweets")
-                        negative_df = df_filtered[df_filtered['Sentiment'].str.lower() == 'negative']
-                        top_countries = negative_df['Country'].value_counts().head(10)
-                        fig4, ax4 = plt.subplots(figsize=(10, 6))
-                        top_countries.plot(kind='bar', color='teal', ax=ax4)
-                        ax4.set_title("Top 10 Countries with Most Negative Tweets")
-                        ax4.set_xlabel("Country")
-                        ax4.set_ylabel("Count")
-                        st.pyplot(fig4)
+                        # Negatives per country from the categorical codes, then the top 10
+                        countries = df_filtered['Country'].cat.categories
+                        neg = (df_filtered['Sentiment'] == 'negative').to_numpy()
+                        counts = np.bincount(df_filtered['Country'].cat.codes.to_numpy()[neg], minlength=len(countries))
+                        k = min(10, len(counts))
+                        top_idx = np.argpartition(-counts, k - 1)[:k]
+                        top_countries = pd.Series(counts[top_idx], index=countries[top_idx]).sort_values(ascending=False)
+                        top_countries = top_countries[top_countries > 0]
+                        st.pyplot(plot_top_negative_countries(top_countries))
 
         except Exception as e:
             st.error(f"❌ File reading failed: {e}")
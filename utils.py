@@ -0,0 +1,21 @@
+import streamlit as st
+import numpy as np
+from pandas.api.types import is_integer_dtype
+
+# Spend and purchase columns summed into Total_Spending and Purchase_Frequency
+SPEND_COLUMNS = ["MntWines", "MntFruits", "MntMeatProducts", "MntFishProducts", "MntSweetProducts", "MntGoldProds"]
+PURCHASE_COLUMNS = ["NumDealsPurchases", "NumWebPurchases", "NumCatalogPurchases", "NumStorePurchases"]
+
+def categorize(df, cols):
+    # Copy of df with the given label columns (when present) stored as categoricals
+    return df.astype({col: "category" for col in cols if col in df.columns})
+
+def row_totals(df, cols):
+    # Row sums that skip NaN like DataFrame.sum(axis=1); all-integer columns stay int64
+    dtype = np.int64 if all(is_integer_dtype(t) for t in df[cols].dtypes) else np.float64
+    return np.nansum(df[cols].to_numpy(dtype=dtype), axis=1)
+
+# Cached CSV encoding for download buttons
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df):
+    return df.to_csv(index=False).encode('utf-8')